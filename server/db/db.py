@@ -1,10 +1,324 @@
 import sqlite3
 import hashlib
+import hmac
 import secrets
-import uuid
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 import json
+import pathlib
+from collections import namedtuple
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+
+# PBKDF2-SHA256 work factor; changing it invalidates existing password hashes
+PBKDF2_ITERATIONS = 100000
+
+# Schema DDL, executed in order inside a single transaction by create_tables
+SCHEMA_STATEMENTS = (
+    # Users table
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username VARCHAR(50) UNIQUE NOT NULL,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        email_verified BOOLEAN DEFAULT 0,
+        password_hash BLOB NOT NULL,
+        salt BLOB,
+        first_name VARCHAR(100),
+        last_name VARCHAR(100),
+        avatar_url VARCHAR(500),
+        bio TEXT,
+        is_active BOOLEAN DEFAULT 1,
+        is_deleted BOOLEAN DEFAULT 0,
+        current_results INTEGER,
+        last_login_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        -- results is created below; the deferred check runs at commit
+        FOREIGN KEY (current_results) REFERENCES results(id)
+            ON DELETE SET NULL DEFERRABLE INITIALLY DEFERRED
+    )
+    """,
+    # Create indexes for users
+    # Email uniqueness is enforced by the column constraint; the login lookup
+    # is served index-only by the partial covering index below
+    "DROP INDEX IF EXISTS idx_users_email",
+    """
+    CREATE INDEX IF NOT EXISTS idx_users_auth
+    ON users(email, username, password_hash, salt, is_active, is_deleted)
+    WHERE is_active = 1 AND is_deleted = 0
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username)",
+    "CREATE INDEX IF NOT EXISTS idx_users_active_deleted ON users(is_active, is_deleted)",
+
+    # User sessions table
+    """
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        id BLOB(16) PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        device_info VARCHAR(500),
+        ip_address VARCHAR(45),
+        is_active BOOLEAN DEFAULT 1,
+        expires_at INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sessions_user_active ON user_sessions(user_id, is_active)",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON user_sessions(expires_at)",
+
+    # Password reset tokens
+    """
+    CREATE TABLE IF NOT EXISTS password_reset_tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        token BLOB UNIQUE NOT NULL,
+        expires_at INTEGER NOT NULL,
+        used_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_reset_token ON password_reset_tokens(token)",
+    "CREATE INDEX IF NOT EXISTS idx_reset_user_expires ON password_reset_tokens(user_id, expires_at)",
+
+    # Email verification tokens
+    """
+    CREATE TABLE IF NOT EXISTS email_verification_tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        token BLOB UNIQUE NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        expires_at INTEGER NOT NULL,
+        verified_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_email_verify_token ON email_verification_tokens(token)",
+    "CREATE INDEX IF NOT EXISTS idx_email_verify_user_expires ON email_verification_tokens(user_id, expires_at)",
+
+    # Roles table
+    """
+    CREATE TABLE IF NOT EXISTS roles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(100) UNIQUE NOT NULL,
+        description TEXT,
+        is_active BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+
+    # Permissions table
+    """
+    CREATE TABLE IF NOT EXISTS permissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(100) UNIQUE NOT NULL,
+        description TEXT,
+        resource VARCHAR(100),
+        action VARCHAR(50),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+
+    # Role permissions junction table
+    """
+    CREATE TABLE IF NOT EXISTS role_permissions (
+        role_id INTEGER,
+        permission_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (role_id, permission_id),
+        FOREIGN KEY (role_id) REFERENCES roles(id) ON DELETE CASCADE,
+        FOREIGN KEY (permission_id) REFERENCES permissions(id) ON DELETE CASCADE
+    )
+    """,
+
+    # User roles junction table
+    """
+    CREATE TABLE IF NOT EXISTS user_roles (
+        user_id INTEGER,
+        role_id INTEGER,
+        assigned_by INTEGER,
+        assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at INTEGER,
+        PRIMARY KEY (user_id, role_id),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (role_id) REFERENCES roles(id) ON DELETE CASCADE,
+        FOREIGN KEY (assigned_by) REFERENCES users(id)
+    )
+    """,
+
+    # Security audit log
+    """
+    CREATE TABLE IF NOT EXISTS user_security_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        event_type VARCHAR(100) NOT NULL,
+        ip_address VARCHAR(45),
+        user_agent VARCHAR(500),
+        success BOOLEAN DEFAULT 1,
+        failure_reason VARCHAR(255),
+        metadata TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_security_logs_user_date ON user_security_logs(user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_security_logs_event_date ON user_security_logs(event_type, created_at)",
+
+    # Friends table
+    """
+    CREATE TABLE IF NOT EXISTS friends (
+        user_id INTEGER NOT NULL,
+        friend_user_id INTEGER NOT NULL,
+        status VARCHAR(20) DEFAULT 'pending',
+        requested_by INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, friend_user_id),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (friend_user_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (requested_by) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_friends_status ON friends(friend_user_id, status)",
+
+    # Results table
+    """
+    CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        extraversion REAL,
+        agreeableness REAL,
+        conscientiousness REAL,
+        emotional_stability REAL,
+        intellect_imagination REAL,
+        test_version VARCHAR(50),
+        is_current BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_results_user_current ON results(user_id, is_current)",
+    "CREATE INDEX IF NOT EXISTS idx_results_user_date ON results(user_id, created_at)",
+
+    # Posts table
+    """
+    CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title VARCHAR(255) NOT NULL,
+        body TEXT,
+        user_id INTEGER NOT NULL,
+        status VARCHAR(20) DEFAULT 'draft',
+        visibility VARCHAR(20) DEFAULT 'public',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_posts_user_status ON posts(user_id, status)",
+    "CREATE INDEX IF NOT EXISTS idx_posts_status_visibility_date ON posts(status, visibility, created_at)",
+)
+
+# users tables created before current_results became a real foreign key keep
+# enforcing it with this trigger, since SQLite can't add the constraint later
+SQL_CREATE_CURRENT_RESULTS_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS fk_users_current_results
+    BEFORE UPDATE OF current_results ON users
+    FOR EACH ROW
+    WHEN NEW.current_results IS NOT NULL
+    BEGIN
+        SELECT CASE
+            WHEN (SELECT id FROM results WHERE id = NEW.current_results) IS NULL
+            THEN RAISE(ABORT, 'Foreign key constraint failed: current_results')
+        END;
+    END
+"""
+
+SQL_DROP_CURRENT_RESULTS_TRIGGER = "DROP TRIGGER IF EXISTS fk_users_current_results"
+
+# PRAGMA user_version of a database whose expires_at values are unix seconds
+SCHEMA_VERSION = 1
+
+# Older databases stored expires_at as local-time TEXT, which never compares
+# less than an integer; convert those rows to unix seconds once, when
+# upgrading a database below SCHEMA_VERSION
+SQL_CONVERT_LEGACY_EXPIRES_AT = tuple(
+    f"""
+    UPDATE {table}
+    SET expires_at = CAST(strftime('%s', expires_at, 'utc') AS INTEGER)
+    WHERE typeof(expires_at) = 'text'
+      AND strftime('%s', expires_at, 'utc') IS NOT NULL
+    """
+    for table in ('user_sessions', 'password_reset_tokens',
+                  'email_verification_tokens', 'user_roles')
+)
+
+
+# Frequently used statements, kept as constants so sqlite3's statement cache
+# reuses the compiled plan across calls
+SQL_INSERT_USER = """
+    INSERT INTO users (username, email, password_hash, salt, first_name, last_name)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+SQL_INSERT_SESSION = """
+    INSERT INTO user_sessions (id, user_id, device_info, ip_address, expires_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+SQL_UPDATE_LAST_LOGIN = "UPDATE users SET last_login_at = CURRENT_TIMESTAMP WHERE id = ?"
+
+SQL_INSERT_SECLOG = """
+    INSERT INTO user_security_logs
+    (user_id, event_type, ip_address, user_agent, success, failure_reason, metadata, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_INSERT_USER_ROLE = """
+    INSERT INTO user_roles (user_id, role_id, assigned_by)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id, role_id) DO UPDATE SET
+        assigned_by = excluded.assigned_by,
+        assigned_at = CURRENT_TIMESTAMP
+"""
+
+SQL_INSERT_ROLES = "INSERT OR IGNORE INTO roles (name, description) VALUES "
+
+SQL_INSERT_PERMISSIONS = "INSERT OR IGNORE INTO permissions (name, description, resource, action) VALUES "
+
+
+# Maximum number of expired sessions deleted per transaction
+CLEANUP_BATCH_SIZE = 1000
+
+# Number of read-only connections kept open for SELECT-only methods
+READER_POOL_SIZE = 4
+
+# Seconds reader() waits for a free connection before re-checking for disconnect()
+READER_WAIT_TIMEOUT = 0.5
+
+# Buffered security log rows are written once this many are pending...
+SECLOG_BUFFER_SIZE = 64
+
+# ...or after this many seconds, whichever comes first
+SECLOG_FLUSH_INTERVAL = 1.0
+
+# Hard cap on buffered rows while writes keep failing; the oldest are dropped
+SECLOG_MAX_BUFFERED = 1024
+
+
+# Fields returned to callers by authenticate_user
+AuthUser = namedtuple("AuthUser", "id username email password_hash salt")
+
+
+def utc_timestamp() -> str:
+    """Current UTC time in CURRENT_TIMESTAMP's format, with microseconds."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
 
 
 class DatabaseManager:
@@ -18,30 +332,155 @@ class DatabaseManager:
         """
         self.db_path = db_path
         self.connection = None
+        self._in_transaction = False
+        self._write_lock = threading.RLock()
+        self._readers = queue.Queue()
+        self._closed = False
+        self._seclog_buf: list = []
+        self._seclog_lock = threading.Lock()
+        self._seclog_timer: Optional[threading.Timer] = None
+        self._role_id_by_name: Dict[str, int] = {}
+        self._permission_id_by_name: Dict[str, int] = {}
+        # Verified against on unknown emails so they take as long as a wrong password
+        self._dummy_hash, self._dummy_salt = self.hash_password(secrets.token_hex(16))
         self.connect()
         self.create_tables()
         self.create_default_roles_and_permissions()
+        self.open_readers()
     
     def connect(self) -> None:
         """Establish connection to the SQLite database."""
         try:
             self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
             self.connection.row_factory = sqlite3.Row  # Enable dict-like access to rows
+            if not self._is_private_db():
+                self.connection.execute("PRAGMA journal_mode = WAL")  # Readers don't block the writer
+            self.connection.execute("PRAGMA synchronous = NORMAL")  # fsync on checkpoint, not every commit
             self.connection.execute("PRAGMA foreign_keys = ON")  # Enable foreign key constraints
+            self.connection.execute("PRAGMA busy_timeout = 30000")
+            self.connection.execute("PRAGMA cache_size = -64000")  # 64 MiB page cache
+            self.connection.execute("PRAGMA temp_store = MEMORY")
+            self.connection.execute("PRAGMA mmap_size = 268435456")
+            self.connection.execute("PRAGMA wal_autocheckpoint = 1000")
             print(f"Connected to database: {self.db_path}")
         except sqlite3.Error as e:
             print(f"Error connecting to database: {e}")
             raise
     
+    def open_readers(self, count: int = READER_POOL_SIZE) -> None:
+        """Open the pool of read-only connections used by reader().
+        
+        In-memory and temporary ("") databases are private to their
+        connection, so no pool is opened for them and reader() falls back to
+        the writer connection.
+        
+        Args:
+            count (int): Number of read-only connections to open
+        """
+        if self._is_private_db():
+            return
+        
+        # as_uri() percent-encodes characters such as '#' and '?' that would
+        # otherwise be parsed as the URI fragment or query string
+        uri = pathlib.Path(self.db_path).absolute().as_uri() + "?mode=ro"
+        
+        try:
+            for _ in range(count):
+                reader = sqlite3.connect(uri, uri=True, check_same_thread=False)
+                reader.row_factory = sqlite3.Row
+                reader.execute("PRAGMA query_only = 1")
+                reader.execute("PRAGMA busy_timeout = 30000")
+                reader.execute("PRAGMA cache_size = -16000")  # 16 MiB page cache
+                reader.execute("PRAGMA mmap_size = 268435456")
+                self._readers.put(reader)
+        except sqlite3.Error as e:
+            print(f"Error opening read-only connections: {e}")
+            raise
+    
+    def _is_private_db(self) -> bool:
+        """Whether the database can only be seen by the writer connection."""
+        return self.db_path in (":memory:", "")
+    
     def disconnect(self) -> None:
         """Close database connection."""
-        if self.connection:
-            self.connection.close()
-            print("Database connection closed")
+        self._closed = True
+        try:
+            self.flush_security_logs()
+        finally:
+            with self._seclog_lock:
+                if self._seclog_timer is not None:
+                    self._seclog_timer.cancel()
+                    self._seclog_timer = None
+            while not self._readers.empty():
+                self._readers.get_nowait().close()
+            if self.connection:
+                self.connection.close()
+                print("Database connection closed")
+    
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection from the pool.
+        
+        Yields:
+            sqlite3.Connection: Read-only connection (the writer if no pool is open)
+            
+        Raises:
+            sqlite3.ProgrammingError: If the database has been disconnected
+        """
+        if self._is_private_db():
+            yield self.connection
+            return
+        
+        # Poll so that waiters notice a disconnect() instead of blocking forever
+        while True:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+            try:
+                reader = self._readers.get(timeout=READER_WAIT_TIMEOUT)
+                break
+            except queue.Empty:
+                pass
+        
+        try:
+            yield reader
+        finally:
+            if self._closed:
+                reader.close()
+            else:
+                self._readers.put(reader)
+    
+    def _execute(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
+        """Execute a SQL query with parameters on the writer connection.
+        
+        Inside a transaction() block the statement joins that transaction.
+        Otherwise a write is committed (or rolled back on error) straight
+        away, so no implicit transaction is left open on the connection.
+        
+        Args:
+            query (str): SQL query to execute
+            params (tuple): Parameters for the query
+            
+        Returns:
+            sqlite3.Cursor: Cursor object with query results
+        """
+        with self._write_lock:
+            try:
+                cursor = self.connection.cursor()
+                cursor.execute(query, params)
+                if not self._in_transaction and self.connection.in_transaction:
+                    self.connection.commit()
+                return cursor
+            except sqlite3.Error:
+                if not self._in_transaction and self.connection.in_transaction:
+                    self.connection.rollback()
+                raise
     
     def execute_query(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
         """Execute a SQL query with parameters.
         
+        Commits immediately unless called inside a transaction() block,
+        in which case the enclosing transaction commits.
+        
         Args:
             query (str): SQL query to execute
             params (tuple): Parameters for the query
@@ -50,235 +489,81 @@ class DatabaseManager:
             sqlite3.Cursor: Cursor object with query results
         """
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, params)
-            self.connection.commit()
-            return cursor
+            return self._execute(query, params)
         except sqlite3.Error as e:
             print(f"Error executing query: {e}")
-            self.connection.rollback()
+            raise
+    
+    @contextmanager
+    def transaction(self):
+        """Run a block of statements in a single write transaction.
+        
+        Commits when the block exits normally and rolls back on error.
+        Nested calls join the outermost transaction; other threads wait
+        until it finishes.
+        
+        Yields:
+            sqlite3.Cursor: Cursor to issue statements on
+        """
+        with self._write_lock:
+            if self._in_transaction:
+                yield self.connection.cursor()
+                return
+            
+            if self.connection.in_transaction:
+                # A write issued directly on self.connection left sqlite3's
+                # implicit transaction open; commit it like execute_query would
+                self.connection.commit()
+            
+            self.connection.execute("BEGIN IMMEDIATE")
+            self._in_transaction = True
+            try:
+                yield self.connection.cursor()
+                self.connection.commit()
+            except BaseException:
+                self.connection.rollback()
+                raise
+            finally:
+                self._in_transaction = False
+    
+    def _execute_many_ddl(self, statements) -> None:
+        """Execute a sequence of SQL statements in a single transaction.
+        
+        Args:
+            statements (Iterable[str]): SQL statements to execute in order
+        """
+        try:
+            with self.transaction() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+        except sqlite3.Error as e:
+            print(f"Error executing statements: {e}")
             raise
     
     def create_tables(self) -> None:
         """Create all database tables."""
+        # A missing users table is created below with the foreign key
+        users_exists = self._execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+        ).fetchone() is not None
+        has_current_results_fk = any(
+            row['from'] == 'current_results' and row['table'] == 'results'
+            for row in self._execute("PRAGMA foreign_key_list(users)")
+        )
         
-        # Users table
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                email_verified BOOLEAN DEFAULT 0,
-                password_hash VARCHAR(255) NOT NULL,
-                salt VARCHAR(255),
-                first_name VARCHAR(100),
-                last_name VARCHAR(100),
-                avatar_url VARCHAR(500),
-                bio TEXT,
-                is_active BOOLEAN DEFAULT 1,
-                is_deleted BOOLEAN DEFAULT 0,
-                current_results INTEGER,
-                last_login_at TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create indexes for users
-        self.execute_query("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-        self.execute_query("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username)")
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_users_active_deleted ON users(is_active, is_deleted)")
-        
-        # User sessions table
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS user_sessions (
-                id VARCHAR(255) PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                device_info VARCHAR(500),
-                ip_address VARCHAR(45),
-                is_active BOOLEAN DEFAULT 1,
-                expires_at TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
-        
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_sessions_user_active ON user_sessions(user_id, is_active)")
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON user_sessions(expires_at)")
-        
-        # Password reset tokens
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS password_reset_tokens (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                token VARCHAR(255) UNIQUE NOT NULL,
-                expires_at TIMESTAMP NOT NULL,
-                used_at TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
-        
-        self.execute_query("CREATE UNIQUE INDEX IF NOT EXISTS idx_reset_token ON password_reset_tokens(token)")
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_reset_user_expires ON password_reset_tokens(user_id, expires_at)")
-        
-        # Email verification tokens
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS email_verification_tokens (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                token VARCHAR(255) UNIQUE NOT NULL,
-                email VARCHAR(255) NOT NULL,
-                expires_at TIMESTAMP NOT NULL,
-                verified_at TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
-        
-        self.execute_query("CREATE UNIQUE INDEX IF NOT EXISTS idx_email_verify_token ON email_verification_tokens(token)")
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_email_verify_user_expires ON email_verification_tokens(user_id, expires_at)")
-        
-        # Roles table
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS roles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name VARCHAR(100) UNIQUE NOT NULL,
-                description TEXT,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Permissions table
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS permissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name VARCHAR(100) UNIQUE NOT NULL,
-                description TEXT,
-                resource VARCHAR(100),
-                action VARCHAR(50),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Role permissions junction table
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS role_permissions (
-                role_id INTEGER,
-                permission_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (role_id, permission_id),
-                FOREIGN KEY (role_id) REFERENCES roles(id) ON DELETE CASCADE,
-                FOREIGN KEY (permission_id) REFERENCES permissions(id) ON DELETE CASCADE
-            )
-        """)
-        
-        # User roles junction table
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS user_roles (
-                user_id INTEGER,
-                role_id INTEGER,
-                assigned_by INTEGER,
-                assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP,
-                PRIMARY KEY (user_id, role_id),
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                FOREIGN KEY (role_id) REFERENCES roles(id) ON DELETE CASCADE,
-                FOREIGN KEY (assigned_by) REFERENCES users(id)
-            )
-        """)
-        
-        # Security audit log
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS user_security_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                event_type VARCHAR(100) NOT NULL,
-                ip_address VARCHAR(45),
-                user_agent VARCHAR(500),
-                success BOOLEAN DEFAULT 1,
-                failure_reason VARCHAR(255),
-                metadata TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
-            )
-        """)
-        
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_security_logs_user_date ON user_security_logs(user_id, created_at)")
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_security_logs_event_date ON user_security_logs(event_type, created_at)")
-        
-        # Friends table
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS friends (
-                user_id INTEGER NOT NULL,
-                friend_user_id INTEGER NOT NULL,
-                status VARCHAR(20) DEFAULT 'pending',
-                requested_by INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (user_id, friend_user_id),
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                FOREIGN KEY (friend_user_id) REFERENCES users(id) ON DELETE CASCADE,
-                FOREIGN KEY (requested_by) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
-        
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_friends_status ON friends(friend_user_id, status)")
-        
-        # Results table
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                extraversion REAL,
-                agreeableness REAL,
-                conscientiousness REAL,
-                emotional_stability REAL,
-                intellect_imagination REAL,
-                test_version VARCHAR(50),
-                is_current BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
-        
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_results_user_current ON results(user_id, is_current)")
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_results_user_date ON results(user_id, created_at)")
-        
-        # Posts table
-        self.execute_query("""
-            CREATE TABLE IF NOT EXISTS posts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title VARCHAR(255) NOT NULL,
-                body TEXT,
-                user_id INTEGER NOT NULL,
-                status VARCHAR(20) DEFAULT 'draft',
-                visibility VARCHAR(20) DEFAULT 'public',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
-        
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_posts_user_status ON posts(user_id, status)")
-        self.execute_query("CREATE INDEX IF NOT EXISTS idx_posts_status_visibility_date ON posts(status, visibility, created_at)")
-        
-        # Add foreign key constraint for current_results
-        self.execute_query("""
-            CREATE TRIGGER IF NOT EXISTS fk_users_current_results
-            BEFORE UPDATE OF current_results ON users
-            FOR EACH ROW
-            WHEN NEW.current_results IS NOT NULL
-            BEGIN
-                SELECT CASE
-                    WHEN (SELECT id FROM results WHERE id = NEW.current_results) IS NULL
-                    THEN RAISE(ABORT, 'Foreign key constraint failed: current_results')
-                END;
-            END
-        """)
+        if has_current_results_fk or not users_exists:
+            current_results_ddl = SQL_DROP_CURRENT_RESULTS_TRIGGER
+        else:
+            current_results_ddl = SQL_CREATE_CURRENT_RESULTS_TRIGGER
+        
+        statements = SCHEMA_STATEMENTS + (current_results_ddl,)
+        user_version = self._execute("PRAGMA user_version").fetchone()[0]
+        if user_version < SCHEMA_VERSION:
+            if users_exists:
+                statements += SQL_CONVERT_LEGACY_EXPIRES_AT
+            statements += (f"PRAGMA user_version = {SCHEMA_VERSION}",)
         
+        self._execute_many_ddl(statements)
         print("All tables created successfully")
     
     def create_default_roles_and_permissions(self) -> None:
@@ -291,15 +576,6 @@ class DatabaseManager:
             ('premium_user', 'Premium user with extended features')
         ]
         
-        for role_name, description in default_roles:
-            try:
-                self.execute_query(
-                    "INSERT OR IGNORE INTO roles (name, description) VALUES (?, ?)",
-                    (role_name, description)
-                )
-            except sqlite3.Error:
-                pass  # Role already exists
-        
         # Default permissions
         default_permissions = [
             ('create_posts', 'Create new posts', 'posts', 'create'),
@@ -312,51 +588,107 @@ class DatabaseManager:
             ('view_results', 'View personality results', 'results', 'read')
         ]
         
-        for perm_name, description, resource, action in default_permissions:
-            try:
-                self.execute_query(
-                    "INSERT OR IGNORE INTO permissions (name, description, resource, action) VALUES (?, ?, ?, ?)",
-                    (perm_name, description, resource, action)
+        try:
+            with self.transaction() as cursor:
+                # One multi-row INSERT per table; OR IGNORE skips existing rows
+                cursor.execute(
+                    SQL_INSERT_ROLES + ", ".join(["(?, ?)"] * len(default_roles)),
+                    [value for row in default_roles for value in row]
                 )
-            except sqlite3.Error:
-                pass  # Permission already exists
+                cursor.execute(
+                    SQL_INSERT_PERMISSIONS + ", ".join(["(?, ?, ?, ?)"] * len(default_permissions)),
+                    [value for row in default_permissions for value in row]
+                )
+        except sqlite3.Error as e:
+            print(f"Error creating default roles and permissions: {e}")
+            raise
         
+        self._load_role_and_permission_ids()
         print("Default roles and permissions created")
     
-    def hash_password(self, password: str, salt: str = None) -> tuple:
+    def _load_role_and_permission_ids(self) -> None:
+        """Populate the in-memory role and permission name -> ID caches."""
+        cursor = self._execute("SELECT id, name FROM roles")
+        self._role_id_by_name = {name: role_id for role_id, name in cursor}
+        cursor = self._execute("SELECT id, name FROM permissions")
+        self._permission_id_by_name = {name: permission_id for permission_id, name in cursor}
+    
+    def get_role_id(self, role_name: str) -> Optional[int]:
+        """Get a role ID by name, using the in-memory cache.
+        
+        Args:
+            role_name (str): Name of the role
+            
+        Returns:
+            Optional[int]: Role ID if the role exists
+        """
+        role_id = self._role_id_by_name.get(role_name)
+        if role_id is None:
+            row = self._execute("SELECT id FROM roles WHERE name = ?", (role_name,)).fetchone()
+            if row:
+                role_id = self._role_id_by_name[role_name] = row[0]
+        return role_id
+    
+    def get_permission_id(self, permission_name: str) -> Optional[int]:
+        """Get a permission ID by name, using the in-memory cache.
+        
+        Args:
+            permission_name (str): Name of the permission
+            
+        Returns:
+            Optional[int]: Permission ID if the permission exists
+        """
+        permission_id = self._permission_id_by_name.get(permission_name)
+        if permission_id is None:
+            row = self._execute("SELECT id FROM permissions WHERE name = ?",
+                               (permission_name,)).fetchone()
+            if row:
+                permission_id = self._permission_id_by_name[permission_name] = row[0]
+        return permission_id
+    
+    def hash_password(self, password: str, salt: bytes = None) -> tuple:
         """Hash a password with salt.
         
         Args:
             password (str): Plain text password
-            salt (str): Optional salt, generates new one if not provided
+            salt (bytes): Optional raw salt, generates new one if not provided
             
         Returns:
-            tuple: (hashed_password, salt)
+            tuple: (hashed_password, salt) as raw bytes
         """
         if salt is None:
-            salt = secrets.token_hex(32)
+            salt = secrets.token_bytes(32)
+        elif isinstance(salt, str):
+            salt = salt.encode('utf-8')  # Hex salts stored before the BLOB columns
         
-        # Use PBKDF2 for password hashing
+        # Use PBKDF2 for password hashing (runs in OpenSSL's C implementation)
         password_hash = hashlib.pbkdf2_hmac('sha256', 
                                           password.encode('utf-8'), 
-                                          salt.encode('utf-8'), 
-                                          100000)  # 100,000 iterations
+                                          salt, 
+                                          PBKDF2_ITERATIONS)
         
-        return password_hash.hex(), salt
+        return password_hash, salt
     
-    def verify_password(self, password: str, stored_hash: str, salt: str) -> bool:
+    def verify_password(self, password: str, stored_hash: bytes, salt: bytes) -> bool:
         """Verify a password against stored hash.
         
         Args:
             password (str): Plain text password to verify
-            stored_hash (str): Stored password hash
-            salt (str): Salt used for hashing
+            stored_hash (bytes): Stored password hash (hex str for legacy rows)
+            salt (bytes): Salt used for hashing (hex str for legacy rows)
             
         Returns:
             bool: True if password matches
         """
-        password_hash, _ = self.hash_password(password, salt)
-        return password_hash == stored_hash
+        # Hex values stored before the BLOB columns
+        if isinstance(salt, str):
+            salt = salt.encode('utf-8')
+        if isinstance(stored_hash, str):
+            stored_hash = bytes.fromhex(stored_hash)
+        
+        candidate = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'),
+                                        salt, PBKDF2_ITERATIONS)
+        return hmac.compare_digest(candidate, stored_hash)
     
     def create_user(self, username: str, email: str, password: str, 
                    first_name: str = None, last_name: str = None) -> Optional[int]:
@@ -375,18 +707,19 @@ class DatabaseManager:
         try:
             password_hash, salt = self.hash_password(password)
             
-            cursor = self.execute_query("""
-                INSERT INTO users (username, email, password_hash, salt, first_name, last_name)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (username, email, password_hash, salt, first_name, last_name))
-            
-            user_id = cursor.lastrowid
-            
-            # Assign default user role
-            self.assign_role_to_user(user_id, 'user', user_id)
-            
-            # Log user creation
-            self.log_security_event(user_id, 'user_created', success=True)
+            with self.transaction():
+                cursor = self._execute(
+                    SQL_INSERT_USER,
+                    (username, email, password_hash, salt, first_name, last_name)
+                )
+                
+                user_id = cursor.lastrowid
+                
+                # Assign default user role
+                self.assign_role_to_user(user_id, 'user', user_id)
+                
+                # Log user creation
+                self.log_security_event(user_id, 'user_created', success=True)
             
             print(f"User created successfully with ID: {user_id}")
             return user_id
@@ -408,19 +741,13 @@ class DatabaseManager:
         """
         try:
             # Get role ID
-            cursor = self.execute_query("SELECT id FROM roles WHERE name = ?", (role_name,))
-            role_row = cursor.fetchone()
+            role_id = self.get_role_id(role_name)
             
-            if not role_row:
+            if role_id is None:
                 print(f"Role '{role_name}' not found")
                 return False
             
-            role_id = role_row['id']
-            
-            self.execute_query("""
-                INSERT OR REPLACE INTO user_roles (user_id, role_id, assigned_by)
-                VALUES (?, ?, ?)
-            """, (user_id, role_id, assigned_by))
+            self.execute_query(SQL_INSERT_USER_ROLE, (user_id, role_id, assigned_by))
             
             return True
             
@@ -429,7 +756,7 @@ class DatabaseManager:
             return False
     
     def create_session(self, user_id: int, device_info: str = None, 
-                      ip_address: str = None, duration_hours: int = 24) -> str:
+                      ip_address: str = None, duration_hours: int = 24) -> bytes:
         """Create a new user session.
         
         Args:
@@ -439,24 +766,26 @@ class DatabaseManager:
             duration_hours (int): Session duration in hours
             
         Returns:
-            str: Session token
+            bytes: Raw 16-byte session token
         """
-        session_id = str(uuid.uuid4())
-        expires_at = datetime.now() + timedelta(hours=duration_hours)
-        
-        self.execute_query("""
-            INSERT INTO user_sessions (id, user_id, device_info, ip_address, expires_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (session_id, user_id, device_info, ip_address, expires_at))
-        
-        # Update last login
-        self.execute_query(
-            "UPDATE users SET last_login_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (user_id,)
-        )
+        session_id = secrets.token_bytes(16)
+        expires_at = int(time.time()) + duration_hours * 3600
         
-        # Log login
-        self.log_security_event(user_id, 'login', ip_address=ip_address, success=True)
+        # Session insert, last login update and login log share one cursor and one commit
+        with self.transaction() as cursor:
+            cursor.execute(
+                SQL_INSERT_SESSION,
+                (session_id, user_id, device_info, ip_address, expires_at)
+            )
+            
+            # Update last login
+            cursor.execute(SQL_UPDATE_LAST_LOGIN, (user_id,))
+            
+            # Log login
+            cursor.execute(
+                SQL_INSERT_SECLOG,
+                (user_id, 'login', ip_address, None, True, None, None, utc_timestamp())
+            )
         
         return session_id
     
@@ -466,6 +795,10 @@ class DatabaseManager:
                           metadata: Dict[str, Any] = None) -> None:
         """Log a security event.
         
+        Inside a transaction() block the event is written as part of that
+        transaction. Otherwise it is buffered and written in a batch by
+        flush_security_logs().
+        
         Args:
             user_id (int): User ID
             event_type (str): Type of event (login, logout, password_change, etc.)
@@ -476,12 +809,101 @@ class DatabaseManager:
             metadata (dict): Additional event data
         """
         metadata_json = json.dumps(metadata) if metadata else None
+        # Stamp the event now; buffered rows may be written a while later
+        row = (user_id, event_type, ip_address, user_agent, success, failure_reason,
+               metadata_json, utc_timestamp())
+        
+        if self._in_transaction:
+            self.execute_query(SQL_INSERT_SECLOG, row)
+            return
+        
+        with self._seclog_lock:
+            self._seclog_buf.append(row)
+            flush_now = len(self._seclog_buf) >= SECLOG_BUFFER_SIZE
+            if not flush_now:
+                self._schedule_seclog_flush()
+        
+        if flush_now:
+            try:
+                self.flush_security_logs()
+            except sqlite3.Error:
+                pass  # Reported and kept for retry; never fail the caller's auth flow
+    
+    def _schedule_seclog_flush(self) -> None:
+        """Start the flush timer if it isn't running. Caller holds _seclog_lock."""
+        if self._seclog_timer is None:
+            self._seclog_timer = threading.Timer(SECLOG_FLUSH_INTERVAL,
+                                                 self._flush_security_logs_on_timer)
+            self._seclog_timer.daemon = True
+            self._seclog_timer.start()
+    
+    def _flush_security_logs_on_timer(self) -> None:
+        """Timer callback; failed rows stay buffered and are retried."""
+        try:
+            self.flush_security_logs()
+        except sqlite3.Error:
+            pass  # Already reported by flush_security_logs
+    
+    def flush_security_logs(self) -> None:
+        """Write all buffered security events in a single transaction.
+        
+        Rows rejected by a constraint are retried one at a time so a single
+        bad row can't block the rest. If the write fails for another reason
+        the events are put back in the buffer (up to SECLOG_MAX_BUFFERED), a
+        retry is scheduled and the error is re-raised.
+        """
+        with self._seclog_lock:
+            rows, self._seclog_buf = self._seclog_buf, []
+            if self._seclog_timer is not None:
+                self._seclog_timer.cancel()
+                self._seclog_timer = None
         
-        self.execute_query("""
-            INSERT INTO user_security_logs 
-            (user_id, event_type, ip_address, user_agent, success, failure_reason, metadata)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, event_type, ip_address, user_agent, success, failure_reason, metadata_json))
+        if not rows:
+            return
+        
+        try:
+            try:
+                with self.transaction() as cursor:
+                    cursor.executemany(SQL_INSERT_SECLOG, rows)
+            except sqlite3.IntegrityError:
+                self._write_security_logs_individually(rows)
+        except sqlite3.Error as e:
+            print(f"Error writing security logs: {e}")
+            with self._seclog_lock:
+                self._seclog_buf[:0] = rows
+                overflow = len(self._seclog_buf) - SECLOG_MAX_BUFFERED
+                if overflow > 0:
+                    del self._seclog_buf[:overflow]
+                    print(f"Security log buffer full, dropped {overflow} oldest events")
+                self._schedule_seclog_flush()
+            raise
+    
+    def _write_security_logs_individually(self, rows: list) -> None:
+        """Write security log rows one by one, repairing or skipping bad rows.
+        
+        A row whose user no longer exists is stored with a NULL user_id, as
+        ON DELETE SET NULL would have done had it been written in time. Rows
+        that still violate a constraint are reported and dropped.
+        
+        Args:
+            rows (list): Row tuples in SQL_INSERT_SECLOG parameter order
+        """
+        with self.transaction() as cursor:
+            for row in rows:
+                try:
+                    cursor.execute(SQL_INSERT_SECLOG, row)
+                    continue
+                except sqlite3.IntegrityError as e:
+                    error = e
+                
+                if row[0] is not None:
+                    try:
+                        cursor.execute(SQL_INSERT_SECLOG, (None,) + row[1:])
+                        continue
+                    except sqlite3.IntegrityError as e:
+                        error = e
+                
+                print(f"Dropping security log event '{row[1]}': {error}")
     
     def get_user_by_email(self, email: str) -> Optional[sqlite3.Row]:
         """Get user by email address.
@@ -492,13 +914,15 @@ class DatabaseManager:
         Returns:
             Optional[sqlite3.Row]: User row if found
         """
-        cursor = self.execute_query(
-            "SELECT * FROM users WHERE email = ? AND is_active = 1 AND is_deleted = 0",
-            (email,)
-        )
-        return cursor.fetchone()
+        with self.reader() as conn:
+            cursor = conn.execute("""
+                SELECT id, username, email, password_hash, salt
+                FROM users INDEXED BY idx_users_auth
+                WHERE email = ? AND is_active = 1 AND is_deleted = 0
+            """, (email,))
+            return cursor.fetchone()
     
-    def authenticate_user(self, email: str, password: str) -> Optional[Dict[str, Any]]:
+    def authenticate_user(self, email: str, password: str) -> Optional[AuthUser]:
         """Authenticate a user with email and password.
         
         Args:
@@ -506,48 +930,103 @@ class DatabaseManager:
             password (str): Plain text password
             
         Returns:
-            Optional[Dict]: User data if authentication successful
+            Optional[AuthUser]: User data if authentication successful
         """
-        user = self.get_user_by_email(email)
+        row = self.get_user_by_email(email)
         
-        if not user:
+        if not row:
+            self.verify_password(password, self._dummy_hash, self._dummy_salt)
             self.log_security_event(None, 'login_failed', 
                                   failure_reason='User not found')
             return None
         
-        if self.verify_password(password, user['password_hash'], user['salt']):
-            return dict(user)
+        # Positional unpacking; the SELECT column order matches AuthUser
+        user_id, username, user_email, password_hash, salt = row
+        if self.verify_password(password, password_hash, salt):
+            return AuthUser(user_id, username, user_email, password_hash, salt)
         else:
-            self.log_security_event(user['id'], 'login_failed', 
+            self.log_security_event(user_id, 'login_failed', 
                                   failure_reason='Invalid password')
             return None
     
-    def cleanup_expired_sessions(self) -> int:
+    def cleanup_expired_sessions(self, batch_size: int = CLEANUP_BATCH_SIZE) -> int:
         """Remove expired sessions.
         
+        Deletes in batches, committing after each one, so the write lock is
+        released between batches and WAL checkpoints can make progress.
+        
+        Args:
+            batch_size (int): Maximum number of sessions deleted per transaction
+            
         Returns:
             int: Number of sessions cleaned up
         """
-        cursor = self.execute_query(
-            "DELETE FROM user_sessions WHERE expires_at < CURRENT_TIMESTAMP"
-        )
-        return cursor.rowcount
+        removed = 0
+        while True:
+            cursor = self.execute_query("""
+                DELETE FROM user_sessions WHERE rowid IN (
+                    SELECT rowid FROM user_sessions
+                    WHERE expires_at < ?
+                    LIMIT ?
+                )
+            """, (int(time.time()), batch_size))
+            if cursor.rowcount <= 0:
+                return removed
+            removed += cursor.rowcount
     
-    def get_database_stats(self) -> Dict[str, int]:
+    def _count_rows(self, table: str) -> int:
+        """Count the rows of a table on a pooled read-only connection.
+        
+        Args:
+            table (str): Table name
+            
+        Returns:
+            int: Exact row count
+        """
+        with self.reader() as conn:
+            cursor = conn.execute(f"SELECT COUNT(*) as count FROM {table}")
+            return cursor.fetchone()[0]
+    
+    def get_database_stats(self, approximate: bool = False) -> Dict[str, int]:
         """Get basic database statistics.
         
+        Args:
+            approximate (bool): Use the row estimates recorded by ANALYZE in
+                sqlite_stat1 where available instead of counting rows
+        
         Returns:
             Dict[str, int]: Statistics about table row counts
         """
+        self.flush_security_logs()  # Count buffered events too
+        
         stats = {}
         tables = ['users', 'user_sessions', 'roles', 'permissions', 
                  'friends', 'results', 'posts', 'user_security_logs']
         
-        for table in tables:
-            cursor = self.execute_query(f"SELECT COUNT(*) as count FROM {table}")
-            stats[table] = cursor.fetchone()['count']
+        if approximate:
+            try:
+                with self.reader() as conn:
+                    cursor = conn.execute(
+                        f"SELECT tbl, stat FROM sqlite_stat1 WHERE tbl IN ({', '.join('?' * len(tables))})",
+                        tables
+                    )
+                    for table, stat in cursor:
+                        # The first field of stat is the estimated row count
+                        count = int(stat.split()[0])
+                        stats[table] = max(stats.get(table, 0), count)
+            except sqlite3.OperationalError:
+                pass  # ANALYZE has never run, so sqlite_stat1 doesn't exist
+        
+        missing = [table for table in tables if table not in stats]
+        if self._is_private_db():
+            counts = map(self._count_rows, missing)
+        else:
+            # Readers don't block each other under WAL, so count in parallel
+            with ThreadPoolExecutor(max_workers=READER_POOL_SIZE) as executor:
+                counts = list(executor.map(self._count_rows, missing))
+        stats.update(zip(missing, counts))
         
-        return stats
+        return {table: stats[table] for table in tables}
 
 
 if __name__ == "__main__":
@@ -579,14 +1058,14 @@ if __name__ == "__main__":
             print("\n=== Creating Sessions ===")
             session1 = db.create_session(user1_id, "Chrome/Windows", "192.168.1.100")
             session2 = db.create_session(user2_id, "Safari/macOS", "192.168.1.101")
-            print(f"Session created for user {user1_id}: {session1}")
-            print(f"Session created for user {user2_id}: {session2}")
+            print(f"Session created for user {user1_id}: {session1.hex()}")
+            print(f"Session created for user {user2_id}: {session2.hex()}")
             
             # Test authentication
             print("\n=== Testing Authentication ===")
             auth_result = db.authenticate_user("john@example.com", "password123")
             if auth_result:
-                print(f"Authentication successful for user: {auth_result['username']}")
+                print(f"Authentication successful for user: {auth_result.username}")
             
             # Assign admin role to first user
             print("\n=== Assigning Roles ===")
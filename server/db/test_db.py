@@ -0,0 +1,263 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import db as db_module
+from db import DatabaseManager
+
+
+class DatabaseManagerTestCase(unittest.TestCase):
+    """Base test case that creates databases in a temporary directory."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+
+    def open_db(self, name: str = "test.db") -> DatabaseManager:
+        db = DatabaseManager(os.path.join(self.tmp_dir, name))
+        self.addCleanup(db.disconnect)
+        return db
+
+
+class TransactionTest(DatabaseManagerTestCase):
+
+    def test_write_outside_transaction_is_committed(self):
+        db = self.open_db()
+        user_id = db.create_user("johndoe", "john@example.com", "password123")
+        db._execute("INSERT INTO results (user_id) VALUES (?)", (user_id,))
+        self.assertFalse(db.connection.in_transaction)
+        
+        db.create_session(user_id)
+        self.assertEqual(db.get_database_stats()['results'], 1)
+
+    def test_transaction_after_raw_connection_write(self):
+        db = self.open_db()
+        user_id = db.create_user("johndoe", "john@example.com", "password123")
+        db.connection.execute("INSERT INTO results (user_id) VALUES (?)", (user_id,))
+        
+        db.create_session(user_id)
+        self.assertEqual(db.get_database_stats()['results'], 1)
+
+
+class ReaderPoolTest(DatabaseManagerTestCase):
+
+    def test_path_with_uri_special_characters(self):
+        for name in ("quiz#1.db", "quiz?1.db", "quiz 1%.db"):
+            with self.subTest(name=name):
+                db = self.open_db(name)
+                db.create_user("johndoe", "john@example.com", "password123")
+                user = db.authenticate_user("john@example.com", "password123")
+                self.assertIsNotNone(user)
+                self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, "quiz")))
+
+    def test_private_databases(self):
+        for path in (":memory:", ""):
+            with self.subTest(path=path):
+                db = DatabaseManager(path)
+                self.addCleanup(db.disconnect)
+                db.create_user("johndoe", "john@example.com", "password123")
+                self.assertIsNotNone(db.authenticate_user("john@example.com", "password123"))
+                self.assertEqual(db.get_database_stats()['users'], 1)
+
+    def test_reads_after_disconnect_raise(self):
+        db = self.open_db()
+        db.disconnect()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            db.get_user_by_email("john@example.com")
+        with self.assertRaises(sqlite3.ProgrammingError):
+            db.get_database_stats()
+
+
+class CurrentResultsConstraintTest(DatabaseManagerTestCase):
+
+    def test_new_database_uses_foreign_key(self):
+        db = self.open_db()
+        user_id = db.create_user("johndoe", "john@example.com", "password123")
+        trigger = db.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'fk_users_current_results'"
+        ).fetchone()
+        self.assertIsNone(trigger)
+        with self.assertRaises(sqlite3.IntegrityError):
+            db.execute_query("UPDATE users SET current_results = 999 WHERE id = ?", (user_id,))
+
+    def test_legacy_users_table_keeps_trigger(self):
+        # users table as created before current_results was a foreign key
+        conn = sqlite3.connect(os.path.join(self.tmp_dir, "test.db"))
+        conn.execute("""
+            CREATE TABLE users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                email VARCHAR(255) UNIQUE NOT NULL,
+                email_verified BOOLEAN DEFAULT 0,
+                password_hash VARCHAR(255) NOT NULL,
+                salt VARCHAR(255),
+                first_name VARCHAR(100),
+                last_name VARCHAR(100),
+                avatar_url VARCHAR(500),
+                bio TEXT,
+                is_active BOOLEAN DEFAULT 1,
+                is_deleted BOOLEAN DEFAULT 0,
+                current_results INTEGER,
+                last_login_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+        db = self.open_db()
+        user_id = db.create_user("johndoe", "john@example.com", "password123")
+        with self.assertRaises(sqlite3.IntegrityError):
+            db.execute_query("UPDATE users SET current_results = 999 WHERE id = ?", (user_id,))
+
+
+class SecurityLogBufferTest(DatabaseManagerTestCase):
+
+    def count_logs(self, db: DatabaseManager) -> int:
+        return db.connection.execute("SELECT COUNT(*) FROM user_security_logs").fetchone()[0]
+
+    def test_flush_when_buffer_full(self):
+        db = self.open_db()
+        for _ in range(db_module.SECLOG_BUFFER_SIZE - 1):
+            db.log_security_event(None, 'login_failed')
+        self.assertEqual(self.count_logs(db), 0)
+        
+        db.log_security_event(None, 'login_failed')
+        self.assertEqual(self.count_logs(db), db_module.SECLOG_BUFFER_SIZE)
+
+    def test_flush_on_timer(self):
+        with mock.patch.object(db_module, "SECLOG_FLUSH_INTERVAL", 0.05):
+            db = self.open_db()
+            db.log_security_event(None, 'login_failed')
+            self.assertEqual(self.count_logs(db), 0)
+            
+            deadline = time.monotonic() + 5
+            while self.count_logs(db) == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(self.count_logs(db), 1)
+
+    def test_flush_on_disconnect(self):
+        db = DatabaseManager(os.path.join(self.tmp_dir, "test.db"))
+        db.log_security_event(None, 'login_failed')
+        db.disconnect()
+        
+        db = self.open_db()
+        self.assertEqual(self.count_logs(db), 1)
+
+    def test_failed_flush_keeps_events(self):
+        db = self.open_db()
+        db.log_security_event(None, 'login_failed')
+        locked = sqlite3.OperationalError("database is locked")
+        with mock.patch.object(db, "transaction", side_effect=locked):
+            with self.assertRaises(sqlite3.OperationalError):
+                db.flush_security_logs()
+        self.assertEqual(self.count_logs(db), 0)
+        
+        db.flush_security_logs()
+        self.assertEqual(self.count_logs(db), 1)
+
+    def test_buffer_is_bounded(self):
+        db = self.open_db()
+        locked = sqlite3.OperationalError("database is locked")
+        with mock.patch.object(db_module, "SECLOG_MAX_BUFFERED", 3), \
+                mock.patch.object(db, "transaction", side_effect=locked):
+            for _ in range(5):
+                db.log_security_event(None, 'login_failed')
+            with self.assertRaises(sqlite3.OperationalError):
+                db.flush_security_logs()
+        
+        db.flush_security_logs()
+        self.assertEqual(self.count_logs(db), 3)
+
+    def test_event_for_deleted_user(self):
+        db = self.open_db()
+        user_id = db.create_user("johndoe", "john@example.com", "password123")
+        other_id = db.create_user("janedoe", "jane@example.com", "password456")
+        self.assertIsNone(db.authenticate_user("john@example.com", "wrong"))
+        self.assertIsNone(db.authenticate_user("jane@example.com", "wrong"))
+        db.execute_query("DELETE FROM users WHERE id = ?", (user_id,))
+        
+        # The dangling user_id must not block the rest of the buffer
+        db.get_database_stats()
+        rows = db.connection.execute(
+            "SELECT user_id FROM user_security_logs WHERE event_type = 'login_failed' ORDER BY id"
+        ).fetchall()
+        self.assertEqual([row[0] for row in rows], [None, other_id])
+        
+        for _ in range(db_module.SECLOG_BUFFER_SIZE + 1):
+            self.assertIsNone(db.authenticate_user("nobody@example.com", "wrong"))
+        db.disconnect()
+        
+        db = self.open_db()
+        self.assertEqual(db.get_database_stats()['user_security_logs'],
+                         2 + 2 + db_module.SECLOG_BUFFER_SIZE + 1)
+
+    def test_events_keep_their_order(self):
+        db = self.open_db()
+        user_id = db.create_user("johndoe", "john@example.com", "password123")
+        self.assertIsNone(db.authenticate_user("john@example.com", "wrong"))
+        db.create_session(user_id)
+        db.flush_security_logs()
+        
+        events = [row[0] for row in db.connection.execute(
+            "SELECT event_type FROM user_security_logs ORDER BY created_at, id"
+        )]
+        self.assertEqual(events, ['user_created', 'login_failed', 'login'])
+
+
+class SessionCleanupTest(DatabaseManagerTestCase):
+
+    def test_legacy_text_expiry_is_cleaned_up(self):
+        db = self.open_db()
+        user_id = db.create_user("johndoe", "john@example.com", "password123")
+        db.create_session(user_id)
+        db.disconnect()
+        
+        # Sessions written before expires_at became unix seconds
+        conn = sqlite3.connect(os.path.join(self.tmp_dir, "test.db"))
+        conn.executemany(
+            "INSERT INTO user_sessions (id, user_id, expires_at) VALUES (?, ?, ?)",
+            [(b"expired", user_id, "2000-01-01 00:00:00"),
+             (b"current", user_id, "2999-01-01 00:00:00")]
+        )
+        # Simulate a database from before the conversion was introduced
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+        conn.close()
+        
+        db = self.open_db()
+        self.assertEqual(db.cleanup_expired_sessions(), 1)
+        remaining = {row[0] for row in db.connection.execute("SELECT id FROM user_sessions")}
+        self.assertEqual(len(remaining), 2)
+        self.assertIn(b"current", remaining)
+        self.assertNotIn(b"expired", remaining)
+
+    def test_legacy_expiry_conversion_runs_once(self):
+        db = self.open_db()
+        self.assertEqual(db.connection.execute("PRAGMA user_version").fetchone()[0],
+                         db_module.SCHEMA_VERSION)
+        user_id = db.create_user("johndoe", "john@example.com", "password123")
+        db.disconnect()
+        
+        conn = sqlite3.connect(os.path.join(self.tmp_dir, "test.db"))
+        conn.execute(
+            "INSERT INTO user_sessions (id, user_id, expires_at) VALUES (?, ?, ?)",
+            (b"text", user_id, "2000-01-01 00:00:00")
+        )
+        conn.commit()
+        conn.close()
+        
+        db = self.open_db()
+        expires_at = db.connection.execute(
+            "SELECT expires_at FROM user_sessions WHERE id = ?", (b"text",)
+        ).fetchone()[0]
+        self.assertEqual(expires_at, "2000-01-01 00:00:00")
+
+
+if __name__ == "__main__":
+    unittest.main()